@@ -0,0 +1,13 @@
+# Gunicorn settings for running the API as a long-lived server:
+#   gunicorn server:app
+import os
+
+bind = '0.0.0.0:' + os.getenv('PORT', '8000')
+worker_class = 'gevent'
+workers = 2
+worker_connections = 1000
+
+def post_fork(server, worker):
+    # Let psycopg2 yield to other greenlets while it waits on the database
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
@@ -1,14 +1,55 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Request, request, jsonify
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+from flask_caching import Cache
+from flask_compress import Compress
 from flask_cors import CORS
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy import case, func, insert, text
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from collections import deque
+from datetime import date, datetime
+import atexit
+import csv
+import hmac
+import io
 import os
+import threading
+import orjson
+import psycopg2
+from psycopg2.extensions import get_wait_callback
+from psycopg2.extras import execute_values
 from dotenv import load_dotenv
+from markupsafe import Markup
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 # Load environment variables
 load_dotenv()
 
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson, used for jsonify and request.get_json."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=DefaultJSONProvider.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+class AnalyticsRequest(Request):
+    """Request that allows larger bodies for the bulk import endpoint."""
+
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'bulk_import':
+            return MAX_BULK_IMPORT_BYTES
+        return super().max_content_length
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+app.request_class = AnalyticsRequest
 
 # Configure CORS for GitHub Pages
 CORS(app)
@@ -16,6 +57,21 @@ CORS(app)
 # Get the environment
 ENV = os.getenv('FLASK_ENV', 'production')
 
+# Vercel sets VERCEL=1 in its serverless runtime
+SERVERLESS = bool(os.getenv('VERCEL'))
+
+# Number of reverse proxies (Vercel's edge, nginx, a PaaS router) in front of
+# the app that append to X-Forwarded-For; set to 0 when clients connect directly
+TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', '1'))
+if TRUSTED_PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT)
+
+# Track payloads are tiny; reject anything larger before parsing it
+app.config['MAX_CONTENT_LENGTH'] = 4096
+
+# Per-client rate limits for the write endpoints
+limiter = Limiter(get_remote_address, app=app, storage_uri='memory://')
+
 # Configure database
 if ENV == 'development':
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///analytics.db'
@@ -29,119 +85,517 @@ else:
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'pool_pre_ping': True,
     'pool_recycle': 300,
 }
+if SERVERLESS and ENV != 'development':
+    connect_args = {'connect_timeout': 3}
+    # connect_args override the URL, so don't weaken an sslmode it already sets
+    if database_url and 'sslmode' not in make_url(database_url).query:
+        connect_args['sslmode'] = 'require'
+    # Keep a single connection per warm instance so invocations reuse it
+    # without holding idle connections against the provider's limit.
+    # A frozen instance can resume with a dead connection, so ping it first.
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'].update(
+        pool_size=1,
+        max_overflow=0,
+        pool_pre_ping=True,
+        connect_args=connect_args
+    )
+elif ENV != 'development':
+    # Sized for gevent workers, where many requests can wait on the database at once
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'].update(pool_size=30, max_overflow=60)
+
+# Maximum number of events per /api/analytics page
+ANALYTICS_EVENT_LIMIT = 1000
+
+# Largest CSV body accepted by /api/bulk-import
+MAX_BULK_IMPORT_BYTES = 50 * 1024 * 1024
+BULK_IMPORT_BATCH_SIZE = 10000
+
+# Tracked visits and events are buffered in memory and written in batches
+FLUSH_BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0  # seconds
+# Track requests get a 503 once this many rows are waiting to be written
+MAX_BUFFERED_ROWS = 10000
 
 db = SQLAlchemy(app)
 
+# Short-lived response cache for the read endpoints
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 30})
+
+def is_ok_response(rv):
+    """Cache only successful view results, never error tuples."""
+    status = rv[1] if isinstance(rv, tuple) else getattr(rv, 'status_code', 200)
+    return status == 200
+
+# Compress text responses, preferring Brotli when the client supports it
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 500
+Compress(app)
+
 # Models
 class Visit(db.Model):
+    __table_args__ = (db.Index('ix_visit_ts_mobile', 'timestamp', 'is_mobile'),)
+
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     is_mobile = db.Column(db.Boolean, nullable=False)
-    screen_resolution = db.Column(db.String(20), nullable=False)
+    resolution_id = db.Column(db.Integer, db.ForeignKey('resolution.id'), nullable=False)
+
+class Resolution(db.Model):
+    # Distinct screen resolution strings, referenced by Visit.resolution_id
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.String(20), nullable=False, unique=True)
 
 class Event(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    event_type = db.Column(db.String(50), nullable=False)
+    event_type = db.Column(db.String(50), nullable=False, index=True)
     event_data = db.Column(db.JSON)
+    # Frequently read fields of event_data, stored as real columns
+    path = db.Column(db.String(255), index=True)
+    duration = db.Column(db.Float)
+
+class VisitDaily(db.Model):
+    # Per-day visit counts, maintained incrementally as visits are flushed
+    date = db.Column(db.Date, primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    mobile = db.Column(db.Integer, nullable=False, default=0)
+
+class Stats(db.Model):
+    # Running visit totals ('total', 'mobile'), maintained alongside the rollup
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+def dialect_insert(table):
+    """Return an INSERT that supports ON CONFLICT on the active database."""
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    return dialect.insert(table)
+
+def increment_counters(model, rows):
+    """Upsert rows into a counter table, adding to existing values on conflict."""
+    table = model.__table__
+    stmt = dialect_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[c.name for c in table.primary_key],
+        set_={c.name: c + stmt.excluded[c.name] for c in table.columns if not c.primary_key}
+    )
+    db.session.execute(stmt, rows)
+
+# Resolution ids by value; only holds rows that have been committed
+_resolution_ids = {}
+
+def lookup_resolution_ids(values):
+    """Return {value: id} for the given resolutions, inserting any new ones."""
+    ids = {v: _resolution_ids[v] for v in values if v in _resolution_ids}
+    missing = [v for v in values if v not in ids]
+    if missing:
+        db.session.execute(
+            dialect_insert(Resolution.__table__).on_conflict_do_nothing(),
+            [{'value': v} for v in missing]
+        )
+        ids.update(db.session.query(Resolution.value, Resolution.id).filter(Resolution.value.in_(missing)))
+    return ids
+
+def insert_visits(rows):
+    """Insert visit rows given as timestamp/is_mobile/screen_resolution dicts."""
+    resolution_ids = lookup_resolution_ids({row['screen_resolution'] for row in rows})
+    db.session.execute(insert(Visit.__table__), [{
+        'timestamp': row['timestamp'],
+        'is_mobile': row['is_mobile'],
+        'resolution_id': resolution_ids[row['screen_resolution']]
+    } for row in rows])
+    return resolution_ids
+
+def increment_visit_counters(rows):
+    """Add visit rows to the daily rollup and running totals."""
+    days = {}
+    for row in rows:
+        day = days.setdefault(row['timestamp'].date(), {'total': 0, 'mobile': 0})
+        day['total'] += 1
+        day['mobile'] += int(row['is_mobile'])
+    increment_counters(VisitDaily, [{'date': d, **c} for d, c in days.items()])
+    increment_counters(Stats, [
+        {'key': 'total', 'value': len(rows)},
+        {'key': 'mobile', 'value': sum(int(row['is_mobile']) for row in rows)}
+    ])
+
+def rebuild_visit_rollup():
+    """Recompute the daily rollup and running totals from the Visit table."""
+    day = func.date(Visit.timestamp)
+    counts = db.session.query(
+        day,
+        func.count(),
+        func.sum(case((Visit.is_mobile, 1), else_=0))
+    ).group_by(day).all()
+    VisitDaily.query.delete()
+    db.session.add_all(
+        # SQLite returns date() as an ISO string
+        VisitDaily(date=d if isinstance(d, date) else date.fromisoformat(d), total=total, mobile=mobile)
+        for d, total, mobile in counts
+    )
+    Stats.query.delete()
+    db.session.add_all([
+        Stats(key='total', value=sum(total for _, total, _ in counts)),
+        Stats(key='mobile', value=sum(mobile for _, _, mobile in counts))
+    ])
+    db.session.commit()
+
+def read_csv_batches(stream):
+    """Yield lists of up to BULK_IMPORT_BATCH_SIZE three-column CSV records."""
+    batch = []
+    for record in csv.reader(io.TextIOWrapper(stream, encoding='utf-8')):
+        if len(record) != 3:
+            raise ValueError(f'Expected 3 columns, got {len(record)}')
+        batch.append(record)
+        if len(batch) == BULK_IMPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def import_visits_csv(stream):
+    """Load visits from a timestamp,is_mobile,screen_resolution CSV stream."""
+    if db.engine.dialect.name == 'postgresql':
+        cursor = db.session.connection().connection.cursor()
+        cursor.execute(
+            'CREATE TEMP TABLE visit_import '
+            '(timestamp TIMESTAMP, is_mobile BOOLEAN, screen_resolution VARCHAR(20)) ON COMMIT DROP'
+        )
+        if get_wait_callback() is None:
+            # COPY streams the rows straight into the staging table
+            cursor.copy_expert('COPY visit_import FROM STDIN WITH (FORMAT csv)', stream)
+        else:
+            # psycopg2 refuses COPY while a wait callback is installed, as psycogreen
+            # does under the gevent workers, so load the staging table in batches
+            for batch in read_csv_batches(stream):
+                # Match COPY's CSV handling of empty fields as NULL
+                rows = [[value or None for value in record] for record in batch]
+                execute_values(cursor, 'INSERT INTO visit_import VALUES %s', rows, page_size=len(rows))
+        cursor.execute(
+            'INSERT INTO resolution (value) SELECT DISTINCT screen_resolution FROM visit_import '
+            'ON CONFLICT DO NOTHING'
+        )
+        cursor.execute(
+            'INSERT INTO visit (timestamp, is_mobile, resolution_id) '
+            'SELECT i.timestamp, i.is_mobile, r.id FROM visit_import i '
+            'JOIN resolution r ON r.value = i.screen_resolution'
+        )
+        # Add only the imported rows to the counters rather than rebuilding them
+        cursor.execute(
+            'INSERT INTO visit_daily (date, total, mobile) '
+            'SELECT timestamp::date, count(*), count(*) FILTER (WHERE is_mobile) FROM visit_import GROUP BY 1 '
+            'ON CONFLICT (date) DO UPDATE SET total = visit_daily.total + excluded.total, '
+            'mobile = visit_daily.mobile + excluded.mobile'
+        )
+        cursor.execute(
+            "INSERT INTO stats (key, value) "
+            "SELECT 'total', count(*) FROM visit_import "
+            "UNION ALL SELECT 'mobile', count(*) FILTER (WHERE is_mobile) FROM visit_import "
+            "ON CONFLICT (key) DO UPDATE SET value = stats.value + excluded.value"
+        )
+        return
+    for batch in read_csv_batches(stream):
+        rows = [{
+            'timestamp': datetime.fromisoformat(timestamp),
+            'is_mobile': is_mobile.lower() in ('1', 't', 'true'),
+            'screen_resolution': screen_resolution
+        } for timestamp, is_mobile, screen_resolution in batch]
+        insert_visits(rows)
+        increment_visit_counters(rows)
+
+# Create tables on startup only for local development; deployments run `flask init-db`
+if ENV == 'development':
+    with app.app_context():
+        db.create_all()
+
+# Write buffers for the track endpoints
+_visit_buffer = deque()
+_event_buffer = deque()
+_buffer_lock = threading.Lock()
+_flush_wakeup = threading.Event()
+_flush_thread = None
+
+def buffer_row(buffer, write, row):
+    """Queue a row for the background flusher; returns False if the buffer is full."""
+    global _flush_thread
+    if SERVERLESS:
+        # A frozen serverless instance may never run the background flusher, so
+        # write only this row now; if that fails it is discarded, not retried
+        try:
+            write([row])
+        except Exception:
+            db.session.rollback()
+            raise
+        return True
+    with _buffer_lock:
+        if len(buffer) >= MAX_BUFFERED_ROWS:
+            return False
+        buffer.append(row)
+        if _flush_thread is None:
+            _flush_thread = threading.Thread(target=_flush_worker, daemon=True)
+            _flush_thread.start()
+    if len(buffer) >= FLUSH_BATCH_SIZE:
+        _flush_wakeup.set()
+    return True
 
-# Create tables
-with app.app_context():
+def _drain(buffer):
+    with _buffer_lock:
+        return [buffer.popleft() for _ in range(min(len(buffer), FLUSH_BATCH_SIZE))]
+
+def _requeue(buffer, rows):
+    with _buffer_lock:
+        buffer.extendleft(reversed(rows))
+
+# Errors that mean the database was unreachable rather than the rows being bad
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, DisconnectionError)
+
+def _write_batch(write, buffer, rows):
+    """Write rows with write(rows), requeueing on connection errors and dropping bad rows."""
+    try:
+        write(rows)
+        return
+    except TRANSIENT_ERRORS:
+        db.session.rollback()
+        _requeue(buffer, rows)
+        raise
+    except Exception:
+        db.session.rollback()
+    # Retry one row at a time so a single bad row can't block the rest
+    for i, row in enumerate(rows):
+        try:
+            write([row])
+        except TRANSIENT_ERRORS:
+            db.session.rollback()
+            _requeue(buffer, rows[i:])
+            raise
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Dropping analytics row that could not be written: %r', row)
+
+def _write_visits(rows):
+    resolution_ids = insert_visits(rows)
+    increment_visit_counters(rows)
+    db.session.commit()
+    _resolution_ids.update(resolution_ids)
+
+def _write_events(rows):
+    db.session.execute(insert(Event.__table__), rows)
+    db.session.commit()
+
+def flush_visits():
+    """Write one batch of buffered visits and their rollup increments."""
+    rows = _drain(_visit_buffer)
+    if rows:
+        _write_batch(_write_visits, _visit_buffer, rows)
+
+def flush_events():
+    """Write one batch of buffered events."""
+    rows = _drain(_event_buffer)
+    if rows:
+        _write_batch(_write_events, _event_buffer, rows)
+
+def flush_all():
+    """Write everything currently buffered."""
+    with app.app_context():
+        while _visit_buffer:
+            flush_visits()
+        while _event_buffer:
+            flush_events()
+
+def _flush_worker():
+    while True:
+        _flush_wakeup.wait(FLUSH_INTERVAL)
+        _flush_wakeup.clear()
+        try:
+            flush_all()
+        except Exception:
+            app.logger.exception('Failed to flush buffered analytics')
+
+atexit.register(flush_all)
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create any missing tables."""
     db.create_all()
 
+@app.cli.command('migrate-visit-index')
+def migrate_visit_index_command():
+    """Add the (timestamp, is_mobile) index to an existing visit table."""
+    db.session.execute(text('CREATE INDEX IF NOT EXISTS ix_visit_ts_mobile ON visit (timestamp, is_mobile)'))
+    db.session.commit()
+
+@app.cli.command('migrate-event-columns')
+def migrate_event_columns_command():
+    """Add and backfill the typed event columns and indexes (PostgreSQL)."""
+    for statement in (
+        'ALTER TABLE event ADD COLUMN IF NOT EXISTS path VARCHAR(255)',
+        'ALTER TABLE event ADD COLUMN IF NOT EXISTS duration FLOAT',
+        "UPDATE event SET path = left(event_data->>'path', 255), "
+        "duration = CASE WHEN json_typeof(event_data->'duration') = 'number' "
+        "THEN (event_data->>'duration')::float END "
+        "WHERE json_typeof(event_data) = 'object'",
+        'CREATE INDEX IF NOT EXISTS ix_event_event_type ON event (event_type)',
+        'CREATE INDEX IF NOT EXISTS ix_event_path ON event (path)',
+    ):
+        db.session.execute(text(statement))
+    db.session.commit()
+
+@app.cli.command('migrate-resolutions')
+def migrate_resolutions_command():
+    """Move visit.screen_resolution strings into the resolution table (PostgreSQL)."""
+    db.create_all()
+    db.session.execute(text(
+        'ALTER TABLE visit ADD COLUMN IF NOT EXISTS resolution_id INTEGER REFERENCES resolution (id)'
+    ))
+    # Nothing left to copy once the old column is gone (or was never created)
+    has_old_column = db.session.execute(text(
+        "SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema() "
+        "AND table_name = 'visit' AND column_name = 'screen_resolution'"
+    )).first() is not None
+    if has_old_column:
+        for statement in (
+            'INSERT INTO resolution (value) SELECT DISTINCT screen_resolution FROM visit ON CONFLICT DO NOTHING',
+            'UPDATE visit SET resolution_id = resolution.id FROM resolution '
+            'WHERE resolution.value = visit.screen_resolution',
+            'ALTER TABLE visit ALTER COLUMN resolution_id SET NOT NULL',
+            'ALTER TABLE visit DROP COLUMN IF EXISTS screen_resolution',
+        ):
+            db.session.execute(text(statement))
+    db.session.commit()
+
+@app.cli.command('backfill-rollup')
+def backfill_rollup_command():
+    """Seed the daily visit rollup and running totals from existing visits."""
+    rebuild_visit_rollup()
+
+def clean_text(value, length):
+    """Coerce a client value to a string the database will accept."""
+    # PostgreSQL text columns cannot store NUL characters
+    return str(value).replace('\x00', '')[:length]
+
 @app.route('/', methods=['GET'])
 def home():
     return jsonify({'status': 'ok', 'message': 'Analytics API is running'}), 200
 
 @app.route('/api/track-visit', methods=['POST'])
+@limiter.limit('60/minute')
 def track_visit():
+    data = request.get_json(silent=True, cache=False)
+    if not isinstance(data, dict):
+        return jsonify({'status': 'error', 'message': 'Invalid JSON payload'}), 400
     try:
-        data = request.json
-        visit = Visit(
-            is_mobile=data.get('isMobile', False),
-            screen_resolution=data.get('screenResolution', 'unknown')
-        )
-        db.session.add(visit)
-        db.session.commit()
-        return jsonify({'status': 'success'}), 200
+        if not buffer_row(_visit_buffer, _write_visits, {
+            'timestamp': datetime.utcnow(),
+            'is_mobile': bool(data.get('isMobile', False)),
+            'screen_resolution': clean_text(data.get('screenResolution', 'unknown'), 20)
+        }):
+            return jsonify({'status': 'error', 'message': 'Too many pending writes'}), 503
+        return jsonify({'status': 'success'}), 202
     except Exception as e:
-        db.session.rollback()
         return jsonify({'status': 'error', 'message': str(e)}), 500
-    finally:
-        db.session.close()
 
 @app.route('/api/track-event', methods=['POST'])
+@limiter.limit('60/minute')
 def track_event():
+    data = request.get_json(silent=True, cache=False)
+    if not isinstance(data, dict):
+        return jsonify({'status': 'error', 'message': 'Invalid JSON payload'}), 400
     try:
-        data = request.json
-        event = Event(
-            event_type=data.get('type'),
-            event_data=data.get('data')
-        )
-        db.session.add(event)
+        if not data.get('type'):
+            return jsonify({'status': 'error', 'message': 'Missing event type'}), 400
+        event_data = data.get('data')
+        fields = event_data if isinstance(event_data, dict) else {}
+        path = fields.get('path')
+        duration = fields.get('duration')
+        if isinstance(duration, bool) or not isinstance(duration, (int, float)):
+            duration = None
+        if not buffer_row(_event_buffer, _write_events, {
+            'timestamp': datetime.utcnow(),
+            'event_type': clean_text(data['type'], 50),
+            'event_data': event_data,
+            'path': clean_text(path, 255) if path is not None else None,
+            'duration': duration
+        }):
+            return jsonify({'status': 'error', 'message': 'Too many pending writes'}), 503
+        return jsonify({'status': 'success'}), 202
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/bulk-import', methods=['POST'])
+def bulk_import():
+    token = os.getenv('ADMIN_TOKEN')
+    authorization = request.headers.get('Authorization', '').encode()
+    if not token or not hmac.compare_digest(authorization, f'Bearer {token}'.encode()):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    if request.content_length is None or request.content_length > MAX_BULK_IMPORT_BYTES:
+        return jsonify({'status': 'error', 'message': 'Payload too large'}), 413
+    try:
+        import_visits_csv(request.stream)
         db.session.commit()
+        cache.clear()
         return jsonify({'status': 'success'}), 200
+    except (ValueError, csv.Error, psycopg2.DataError, psycopg2.IntegrityError) as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': f'Invalid CSV: {e}'}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'status': 'error', 'message': str(e)}), 500
-    finally:
-        db.session.close()
 
 @app.route('/api/analytics', methods=['GET'])
+@cache.cached(query_string=True, response_filter=is_ok_response)
 def get_analytics():
     try:
-        visits = Visit.query.all()
-        events = Event.query.all()
-        
+        stats = dict(db.session.query(Stats.key, Stats.value).all())
+        total_visits = stats.get('total', 0)
+        mobile_visits = stats.get('mobile', 0)
+        event_counts = db.session.query(Event.event_type, func.count()).group_by(Event.event_type).all()
+        # Page through events newest first; ?cursor= is the last id of the previous page
+        limit = min(max(request.args.get('limit', ANALYTICS_EVENT_LIMIT, type=int), 1), ANALYTICS_EVENT_LIMIT)
+        cursor = request.args.get('cursor', type=int)
+        # Read only the typed columns so the JSON payload is never decoded
+        query = db.session.query(Event.id, Event.event_type, Event.path, Event.duration)
+        if cursor is not None:
+            query = query.filter(Event.id < cursor)
+        events = query.order_by(Event.id.desc()).limit(limit).all()
+
         analytics_data = {
-            'total_visits': len(visits),
-            'mobile_visits': sum(1 for v in visits if v.is_mobile),
-            'desktop_visits': sum(1 for v in visits if not v.is_mobile),
-            'events': [{'type': e.event_type, 'data': e.event_data} for e in events]
+            'total_visits': total_visits,
+            'mobile_visits': mobile_visits,
+            'desktop_visits': total_visits - mobile_visits,
+            'event_counts': dict(event_counts),
+            'events': [{'type': t, 'path': p, 'duration': d} for _, t, p, d in events],
+            'next_cursor': events[-1].id if len(events) == limit else None
         }
         
         return jsonify(analytics_data), 200
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
-    finally:
-        db.session.close()
 
 @app.route('/dashboard')
+@cache.cached(response_filter=is_ok_response)
 def dashboard():
     try:
-        visits = Visit.query.order_by(Visit.timestamp).all()
-        
+        days = VisitDaily.query.order_by(VisitDaily.date).all()
+
         # Calculate basic stats
-        total_visits = len(visits)
-        mobile_visits = sum(1 for v in visits if v.is_mobile)
+        total_visits = sum(d.total for d in days)
+        mobile_visits = sum(d.mobile for d in days)
         desktop_visits = total_visits - mobile_visits
 
         # Prepare visit data for the time series chart
-        from collections import defaultdict
-        
-        visit_dates = defaultdict(int)
-        for visit in visits:
-            date_str = visit.timestamp.strftime('%Y-%m-%d')
-            visit_dates[date_str] += 1
-        
-        # Sort dates and prepare data for the chart
-        sorted_dates = sorted(visit_dates.keys())
-        visit_counts = [visit_dates[date] for date in sorted_dates]
+        sorted_dates = [d.date.strftime('%Y-%m-%d') for d in days]
+        visit_counts = [d.total for d in days]
 
-        return render_template_string(DASHBOARD_HTML,
+        return DASHBOARD_TEMPLATE.render(
             total_visits=total_visits,
             mobile_visits=mobile_visits,
             desktop_visits=desktop_visits,
-            visit_dates=sorted_dates,
-            visit_counts=visit_counts
-        )
+            visit_dates=Markup(orjson.dumps(sorted_dates).decode()),
+            visit_counts=Markup(orjson.dumps(visit_counts).decode())
+        ), 200, {'Cache-Control': 'public, max-age=60'}
     except Exception as e:
         return str(e), 500
-    finally:
-        db.session.close()
 
 # HTML template for the dashboard
 DASHBOARD_HTML = """
@@ -257,10 +711,10 @@ DASHBOARD_HTML = """
         new Chart(visitsCtx, {
             type: 'line',
             data: {
-                labels: {{ visit_dates | safe }},
+                labels: {{ visit_dates }},
                 datasets: [{
                     label: 'Visits',
-                    data: {{ visit_counts | safe }},
+                    data: {{ visit_counts }},
                     borderColor: '#3498db',
                     tension: 0.1
                 }]
@@ -288,6 +742,9 @@ DASHBOARD_HTML = """
 </html>
 """
 
+# Compile the dashboard template once instead of on every request
+DASHBOARD_TEMPLATE = app.jinja_env.from_string(DASHBOARD_HTML)
+
 # Vercel requires a handler function
 app.debug = ENV == 'development'
 